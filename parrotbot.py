@@ -17,12 +17,145 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import discord
+import aiohttp
 import asyncio
 import time
 import datetime
+import functools
 import json
+import pathlib
 import re
-import urllib.request
+import sys
+
+# Regular expression object used to recognise partial quotes. Other quotes are
+# recognised by ParrotBot.parse_quote(). The author can't contain a
+# greater-sign outside of a mention string, so character classes keep the
+# engine from backtracking past it.
+RE_PARTIAL_QUOTE = re.compile(
+    r"\s*(?P<author><[^>\n]*>|[^>\n]*?)\s*>>\s*(?P<content>.+)"
+)
+
+# Regular expression object for user mention strings.
+RE_USER_MENTION = re.compile(r"<@!?(?P<ID>.*?)>")
+
+# Help and info messages of the bot. The placeholder is filled in with the
+# bot's user ID once in on_ready().
+HELP_MESSAGE = ("Quoting other users’ messages is easy. Just type a "
+    "greater-sign (>), followed by an excerpt from the message you "
+    "want to quote:\n```> sample message```\nI will attempt to "
+    "find the right message based on that excerpt and display it.\n"
+    "If I found the wrong message, consider increasing the length of "
+    "your excerpt. You can also preceed the greater-sign with a user’s "
+    "name to limit my search to messages from that user:\n"
+    "```sample_user > sample message```\nIf you want me to not display "
+    "the full message but only the part you gave me, type two "
+    "greater-signs instead of one:\n```>> sample```\nFor more "
+    "information on me, type “<@%s> info”. Also, if you still have "
+    "questions, feel free to join my support Discord: "
+    "https://discord.gg/rMXH2Rg")
+
+INFO_MESSAGE = ("Hi, my name is ParrotBot and I’m here to assist you with "
+    "quoting other users’ messages – a functionality Discord still "
+    "lacks by default. If you’d like to know how to do that, just type "
+    "“<@%s> help”. Also, feel free to take a look at my source code on "
+    "https://github.com/mart-w/parrotbot/ if you’re interested in the "
+    "nitty gritty details.\n\nPlease note that I am free software: you "
+    "can redistribute my source code and/or modify it under the terms "
+    "of the GNU General Public License as published by the Free "
+    "Software Foundation, either version 3 of the License, or "
+    "(at your option) any later version.\n\nI am distributed in the "
+    "hope that I will be useful, but **without any warranty**; without "
+    "even the implied warranty of merchantability or fitness for a "
+    "particular purpose. See the GNU General Public License for more "
+    "details: http://www.gnu.org/licenses/")
+
+@functools.lru_cache(maxsize=256)
+def compile_literal(literal, word_start=False):
+    """
+    Compile a case-insensitive regular expression matching a literal string.
+
+    The compiled objects are cached, so that repeated quotes don't need to be
+    escaped and compiled again.
+
+    Parameters
+    ----------
+    literal : str
+        The string the regular expression should match, without escaping.
+    word_start : boolean
+        [Optional] Whether the string may only match at the beginning of a
+        word, if it begins with a word character.
+
+    Returns
+    -------
+    re.Pattern
+    """
+    pattern = re.escape(literal)
+
+    # Before a non-word character, a word boundary would require a word
+    # character in front of it instead.
+    if word_start and re.match(r"\w", literal):
+        pattern = r"\b" + pattern
+
+    return re.compile(pattern, flags=re.IGNORECASE)
+
+def find_casefolded(text, needle):
+    """
+    Find the part of a string that matches a casefolded string.
+
+    Casefolding can change the length of a string, e.g. "ß" becomes "ss", so
+    keep track of which character of the text every folded character stems
+    from.
+
+    Parameters
+    ----------
+    text : str
+        The string to search in.
+    needle : str
+        The casefolded string to search for.
+
+    Returns
+    -------
+    str or None
+        The part of text whose casefolded version contains needle, or None if
+        there is none.
+    """
+    folded_text = []
+    origins = []
+
+    for index, character in enumerate(text):
+        folded_character = character.casefold()
+        folded_text.append(folded_character)
+        origins.extend([index] * len(folded_character))
+
+    start = "".join(folded_text).find(needle)
+
+    if start == -1 or not needle:
+        return None
+
+    return text[origins[start]:origins[start + len(needle) - 1] + 1]
+
+class ChannelLogs:
+    """Message logs of a channel cached by ParrotBot."""
+
+    def __init__(self, message):
+        """
+        Start the logs with the message that caused them to be cached.
+
+        Parameters
+        ----------
+        message : discord.Message
+            The newest message of the channel.
+        """
+        # When the logs were started.
+        self.created = time.monotonic()
+
+        # Messages received since then and messages fetched from before that,
+        # newest first and without gaps.
+        self.messages = [message]
+
+        # Held while older messages are being fetched, so that quotes needing
+        # them wait for that request instead of making their own.
+        self.fetch_lock = asyncio.Lock()
 
 class ParrotBot(discord.Client):
     """Extend discord.Client with an event listener and additional methods."""
@@ -50,7 +183,56 @@ class ParrotBot(discord.Client):
         self.config = config
 
         # How many messages are fetched at most by search_message_by_quote().
-        self.log_fetch_limit = 100
+        self.log_fetch_limit = 25
+
+        # How many messages search_message_by_quote() fetches at first, before
+        # fetching the rest up to self.log_fetch_limit.
+        self.log_first_fetch_limit = 10
+
+        # How many messages of the quote's author search_message_by_quote()
+        # checks at most, if an author is given.
+        self.author_search_limit = 10
+
+        # How long before a quote a message may have been posted at most to be
+        # found by search_message_by_quote().
+        self.log_age_limit = datetime.timedelta(hours=6)
+
+        # Limits how many quotes are being resolved at the same time, so that a
+        # burst of quotes can't pile up an unbounded number of log fetches.
+        self.quote_semaphore = asyncio.Semaphore(8)
+
+        # How many seconds resolving a single quote may take at most.
+        self.quote_timeout = 30
+
+        # Cached message logs by channel ID, as ChannelLogs objects. Started
+        # by self.on_message() for quotes, filled up by fetch_logs() and
+        # removed again after self.log_cache_ttl seconds.
+        self.log_cache = {}
+
+        # For how many seconds fetched message logs are reused.
+        self.log_cache_ttl = 10
+
+        # Regular expression object for commands, the mention strings of the
+        # bot commands begin with and the help and info messages, initialised
+        # in on_ready().
+        self.re_command = None
+        self.mention_strings = None
+        self.help_message = None
+        self.info_message = None
+
+        # HTTP session for posting to bot list sites, created in on_ready() and
+        # closed in close().
+        self.bot_list_session = None
+
+        # Task created by schedule_server_count_post() until it has finished
+        # posting, if any.
+        self.server_count_post = None
+
+        # Whether the server count has changed since the task last read it.
+        self.server_count_changed = False
+
+        # How many seconds schedule_server_count_post() waits before posting.
+        self.server_count_post_delay = 2
 
         # Will be set to True after initialisation.
         self.initialised = False
@@ -59,156 +241,386 @@ class ParrotBot(discord.Client):
         """
         Post how many servers are connected to Discord bot list sites.
 
-        Create a JSON string containing how many servers are connected right
-        now and post it to discordbots.org and bots.discord.pw using the
-        respective tokens from the config file. If the token for a site is not
-        given, ignore that site.
+        Post how many servers are connected right now to discordbots.org and
+        bots.discord.pw at the same time, using the respective tokens from the
+        config file. If the token for a site is not given, ignore that site.
         """
-        count_json = json.dumps({
-            "server_count": len(self.servers)
-        })
+        # The JSON body is simple enough to be formatted directly.
+        body = b'{"server_count": %d}' % (len(self.servers))
+
+        await asyncio.gather(
+            self.post_to_bot_list(
+                "https://discordbots.org/api/bots/%s/stats" % (self.user.id),
+                self.config["discordbots_org_token"],
+                body
+            ),
+            self.post_to_bot_list(
+                "https://bots.discord.pw/api/bots/%s/stats" % (self.user.id),
+                self.config["bots_discord_pw_token"],
+                body
+            )
+        )
 
-        # discordbots.org
-        if self.config["discordbots_org_token"]:
-            # Resolve HTTP redirects
-            dbotsorg_redirect_url = urllib.request.urlopen(
-                "http://discordbots.org/api/bots/%s/stats" % (self.user.id)
-            ).geturl()
+    async def post_to_bot_list(self, url, token, body):
+        """
+        Post data as JSON to the API of a Discord bot list site.
 
-            # Construct request and post server count
-            dbotsorg_req = urllib.request.Request(dbotsorg_redirect_url)
+        Print a message if the site doesn't respond with a success status.
 
-            dbotsorg_req.add_header(
-                "Content-Type",
-                "application/json"
-            )
-            dbotsorg_req.add_header(
-                "Authorization",
-                self.config["discordbots_org_token"]
-            )
+        Parameters
+        ----------
+        url : str
+            The API endpoint to post to.
+        token : str
+            The API token for the site. If empty, don't post anything.
+        body : bytes
+            The JSON encoded data to post.
+        """
+        if not token:
+            return
+
+        # A redirect would turn the POST into a GET without the data, so
+        # report it like any other failed post.
+        async with self.bot_list_session.post(
+            url,
+            data=body,
+            headers={
+                "Authorization": token,
+                "Content-Type": "application/json"
+            },
+            allow_redirects=False
+        ) as response:
+            if not 200 <= response.status < 300:
+                print("Posting to %s failed: %d %s\n" % (
+                    url,
+                    response.status,
+                    response.reason
+                ))
+
+    def schedule_server_count_post(self):
+        """
+        Post the server count to Discord bot list sites after a short delay.
 
-            urllib.request.urlopen(dbotsorg_req, count_json.encode("ascii"))
+        Unless such a task is already running, create a task that waits
+        self.server_count_post_delay seconds and then calls
+        self.post_server_count(). That way, servers joined or left in short
+        succession, e.g. when reconnecting, only cause one post. Changes made
+        while the task is posting are posted by it afterwards.
+        """
+        self.server_count_changed = True
 
-        # bots.discord.pw
-        if self.config["bots_discord_pw_token"]:
-            # Resolve HTTP redirects
-            botsdpw_redirect_url_req = urllib.request.Request(
-                "http://bots.discord.pw/api/bots/%s/stats" % (self.user.id)
+        if self.server_count_post is None:
+            self.server_count_post = self.loop.create_task(
+                self.post_server_count_later()
             )
 
-            botsdpw_redirect_url_req.add_header(
-                "Authorization",
-                self.config["bots_discord_pw_token"]
-            )
+    async def post_server_count_later(self):
+        """
+        Wait, then post the server count. See schedule_server_count_post().
 
-            botsdpw_redirect_url = urllib.request.urlopen(
-                botsdpw_redirect_url_req
-            ).geturl()
+        Keep posting after another delay as long as the server count changes
+        while posting. Print errors instead of raising them, as nothing awaits
+        this task.
+        """
+        try:
+            while self.server_count_changed:
+                await asyncio.sleep(self.server_count_post_delay)
+
+                # Changes from here on need another post.
+                self.server_count_changed = False
+
+                await self.post_server_count()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            print("Posting the server count failed:")
+            print(type(exception))
+            print(exception)
+            print()
+        finally:
+            self.server_count_post = None
+
+    def parse_quote(self, content):
+        """
+        Split a message into the author and the content part of a quote.
 
-            # Construct request and post server count
-            botsdpw_req = urllib.request.Request(botsdpw_redirect_url)
+        Split the message at the first greater-sign, unless the message begins
+        with a mention string that is followed by a greater-sign, in which case
+        the mention string is the author. Strip whitespace from both parts. If
+        there is no greater-sign, no content after it or if one of the parts
+        spans multiple lines, the message is not a quote and None is returned.
 
-            botsdpw_req.add_header(
-                "Content-Type",
-                "application/json"
-            )
-            botsdpw_req.add_header(
-                "Authorization",
-                self.config["bots_discord_pw_token"]
-            )
+        Parameters
+        ----------
+        content : str
+            Content of the message that could be a quote.
+
+        Returns
+        -------
+        tuple of str or None
+            The author and the content part of the quote.
+        """
+        author, separator, quote_content = content.strip().partition(">")
+
+        # A mention string contains a greater-sign itself.
+        if author.startswith("<") and quote_content.lstrip().startswith(">"):
+            mention_content = quote_content.lstrip()[1:].strip()
+
+            if mention_content and "\n" not in author + mention_content:
+                author += ">"
+                quote_content = mention_content
 
-            urllib.request.urlopen(botsdpw_req, count_json.encode("ascii"))
+        author = author.strip()
+        quote_content = quote_content.strip()
 
-    async def is_same_user(self, user_obj, user_str):
+        if not separator or not quote_content \
+        or "\n" in author or "\n" in quote_content:
+            return None
+
+        return author, quote_content
+
+    def expire_channel_logs(self, channel_id, channel_logs):
         """
-        Check if a given string represents a given User.
+        Remove cached logs of a channel, unless they have been replaced.
 
-        If the string resembles a mention string, truncate it so that only
-        the user ID is left.
+        Parameters
+        ----------
+        channel_id : str
+            ID of the channel the logs belong to.
+        channel_logs : ChannelLogs
+            The logs to remove.
+        """
+        if self.log_cache.get(channel_id) is channel_logs:
+            del self.log_cache[channel_id]
 
-        Then, check if:
-            1. the given string is (the beginning of) the user's id.
-            2. the given string is (contained in) the user's full user name.
-            3. the given string is (contained in) the user's display name.
+    async def fetch_logs(self, quote, limit, fetched=()):
+        """
+        Get the messages that were posted before a quote in its channel.
 
-        If any of that is true, return True, otherwise return False.
+        If the cached logs of the quote's channel have been started less than
+        self.log_cache_ttl seconds ago and reach back to the quote, reuse them,
+        so that several quotes in short succession share their requests. Only
+        fetch messages that are missing from the cache, i.e. older ones if the
+        cached logs are too short, and add them to the cache. Only one such
+        request is made per channel at a time. Quotes that can't use the cache
+        fetch their logs without caching them, continuing after the messages
+        fetched by an earlier call.
 
         Parameters
         ----------
-        user_obj : discord.User
-        user_str : str
+        quote : discord.Message
+            Message object containing a quote.
+        limit : int
+            How many messages to get at most.
+        fetched : list of discord.Message
+            [Optional] The result of an earlier call for the same quote.
 
         Returns
         -------
-        boolean
+        list of discord.Message
+            The messages posted before the quote, newest first.
         """
-        # If user_str is a mention string, replace it by just the ID contained
-        # in it
-        mention_search_result = self.re_user_mention.search(user_str)
-
-        if mention_search_result:
-            user_str = mention_search_result.group("ID")
-
-        # Escape user input
-        user_str = re.escape(user_str)
+        channel_logs = self.log_cache.get(quote.channel.id)
+        quote_id = int(quote.id)
+
+        if channel_logs \
+        and time.monotonic() - channel_logs.created < self.log_cache_ttl:
+            async with channel_logs.fetch_lock:
+                # Logs started after the quote arrived may miss messages
+                # before it.
+                if channel_logs.messages \
+                and int(channel_logs.messages[-1].id) <= quote_id:
+                    logs = [
+                        message for message in channel_logs.messages
+                        if int(message.id) < quote_id
+                    ]
+
+                    if len(logs) < limit:
+                        await self.fetch_older_logs(
+                            channel_logs,
+                            quote.channel,
+                            limit - len(logs),
+                            logs
+                        )
+
+                    return logs[:limit]
+
+        logs = list(fetched)
+
+        if len(logs) < limit:
+            async for message in self.logs_from(
+                quote.channel,
+                limit=limit - len(logs),
+                before=logs[-1] if logs else quote
+            ):
+                logs.append(message)
+
+        return logs[:limit]
+
+    async def fetch_older_logs(self, channel_logs, channel, limit, logs):
+        """
+        Fetch messages older than the cached logs of a channel and cache them.
 
-        user_obj_full_name = user_obj.name + '#' + user_obj.discriminator
+        Call with channel_logs.fetch_lock held. Messages that are already
+        cached are skipped.
 
-        if user_obj.id.find(user_str) == 0 \
-        or re.search(user_str, user_obj_full_name, flags=re.IGNORECASE) \
-        or re.search(user_str, user_obj.display_name, flags=re.IGNORECASE):
-            return True
-        else:
-            return False
+        Parameters
+        ----------
+        channel_logs : ChannelLogs
+            The cached logs of the channel.
+        channel : discord.Channel
+            The channel to fetch messages from.
+        limit : int
+            How many messages to fetch at most.
+        logs : list of discord.Message
+            List the fetched messages are appended to as well.
+        """
+        cached_ids = set(message.id for message in channel_logs.messages)
 
-    async def search_message_by_quote(self, quote, partial=False):
+        # The cached logs are ordered from newest to oldest as well, so the
+        # fetched messages belong at their end.
+        async for message in self.logs_from(
+            channel,
+            limit=limit,
+            before=channel_logs.messages[-1]
+        ):
+            if message.id in cached_ids:
+                continue
+
+            logs.append(message)
+            channel_logs.messages.append(message)
+
+    async def search_message_by_quote(
+        self,
+        quote,
+        quote_author,
+        quote_content,
+        partial=False
+    ):
         """
         Finds a quote in a given channel and returns the found Message.
 
-        Fetch an amount of messages older than the given quote from the channel
-        the quote originates from, depending on self.log_fetch_limit. Then
-        search for a message containing the quote or one whose ID begins with
-        the quote string and return it if found. If an author is given in the
-        quote, only consider posts of that author. If no matching message is
-        found, return None.
+        Get an amount of messages older than the given quote from the channel
+        the quote originates from, using self.fetch_logs(), first up to
+        self.log_first_fetch_limit, then up to self.log_fetch_limit if needed.
+        Then, going back no further than self.log_age_limit, search for a
+        message containing the quote or one whose ID begins with the quote
+        string and return it if found, along with the quoted part of its
+        content in case of a partial quote. If no matching message is found,
+        return None for both.
+
+        If an author is given in the quote, only consider posts of that author,
+        and at most self.author_search_limit of them. If the author string
+        contains a mention string, the author is the user with the ID given in
+        it. Otherwise a user is considered the author if:
+            1. the given string is (the beginning of) the user's id.
+            2. the given string occurs at the beginning of a word in the user's
+               full user name, including the discriminator.
+            3. the given string occurs at the beginning of a word in the user's
+               display name.
 
         Parameters
         ----------
         quote : discord.Message
             Message object containing a quote from another Message from the
             same channel.
+        quote_author : str
+            Author part of the quote, empty if no author is given.
+        quote_content : str
+            Content part of the quote.
         partial : boolean
             [Optional] Whether the quote being dealt with is a partial one.
 
         Returns
         -------
         discord.Message or None
+            The found message.
+        str or None
+            The quoted part of the found message's content, if the quote is a
+            partial one.
         """
-        if partial:
-            match = self.re_partial_quote.fullmatch(quote.content).groupdict()
-        else:
-            match = self.re_quote.fullmatch(quote.content).groupdict()
-
-        async for message in self.logs_from(
-            quote.channel,
-            limit=self.log_fetch_limit,
-            before=quote
-        ):
-            if not match["author"] \
-            or await self.is_same_user(message.author, match["author"]):
-                if not message.author.bot \
+        # Prepare the author filter once instead of for every message.
+        author_str = quote_author
+        author_id = None
+
+        if author_str:
+            # A mention string identifies the author exactly by their ID.
+            mention_search_result = RE_USER_MENTION.search(author_str)
+
+            if mention_search_result:
+                author_id = mention_search_result.group("ID")
+
+            # Matches the string at the beginning of words in the names.
+            author_pattern = compile_literal(author_str, True)
+
+        # The content is a literal as well, so a caseless substring test
+        # suffices.
+        content_needle = quote_content.casefold()
+
+        # How many messages of the given author have been checked.
+        authored_seen = 0
+
+        oldest_timestamp = quote.timestamp - self.log_age_limit
+
+        # Most quotes refer to one of the latest messages, so only fetch a few
+        # of them at first and more if needed.
+        logs = []
+        checked = 0
+
+        for limit in (self.log_first_fetch_limit, self.log_fetch_limit):
+            logs = await self.fetch_logs(quote, limit, logs)
+
+            for message in logs[checked:]:
+                # The logs are ordered from newest to oldest, so all following
+                # messages are too old as well.
+                if message.timestamp < oldest_timestamp:
+                    return None, None
+
+                author = message.author
+
+                # Skip messages of other users before looking at their content.
+                if author_id is not None:
+                    if author.id != author_id:
+                        continue
+                elif author_str \
+                and not author.id.startswith(author_str) \
+                and not author_pattern.search(
+                    "%s#%s" % (author.name, author.discriminator)
+                ) \
+                and not author_pattern.search(author.display_name):
+                    continue
+
+                if not author.bot \
                 and not message.content.startswith(">") \
-                and (message.id.find(match["content"]) == 0 and not partial \
-                or re.search(
-                    re.escape(match["content"]),
-                    message.content,
-                    flags=re.IGNORECASE
-                )):
-                    return message
+                and (not partial and message.id.startswith(quote_content) \
+                or content_needle in message.content.casefold()):
+                    excerpt = None
 
-        return None
+                    if partial:
+                        # Get the quoted part as it is spelled in the message,
+                        # folded the same way as for the test above.
+                        excerpt = find_casefolded(
+                            message.content,
+                            content_needle
+                        )
 
-    async def timedelta_timestamp_string(self, timedelta):
+                    return message, excerpt
+
+                if author_str:
+                    authored_seen += 1
+
+                    if authored_seen >= self.author_search_limit:
+                        return None, None
+
+            # No more messages left in the channel.
+            if len(logs) < limit:
+                break
+
+            checked = len(logs)
+
+        return None, None
+
+    def timedelta_timestamp_string(self, timedelta):
         """
         Generate a string that expresses a time difference in words.
 
@@ -225,69 +637,27 @@ class ParrotBot(discord.Client):
         -------
         str
         """
-        days = timedelta.days
-
-        years = days // 365
-        days -= years * 365
-
-        seconds = timedelta.seconds
-
-        minutes = seconds // 60
-        seconds -= minutes * 60
-
-        hours = minutes // 60
-        minutes -= hours * 60
-
-        timedelta_string = ""
-
-        if years > 0:
-            timedelta_string += str(years) + " years"
-
-            # Was this the last element to be printed? If not ...
-            if days + hours + minutes + seconds > 0:
-                timedelta_string += " and "
-            if days + hours + minutes + seconds > 0:
-                # Was this the second last element to be printed? If so ...
-                if hours + minutes + seconds == 0:
-                    timedelta_string += " and "
-                else:
-                    timedelta_string += ", "
-
-        if days > 0:
-            timedelta_string += str(days) + " days"
-
-            # Was this the last element to be printed? If not ...
-            if hours + minutes + seconds > 0:
-                # Was this the second last element to be printed? If so ...
-                if minutes + seconds == 0:
-                    timedelta_string += " and "
-                else:
-                    timedelta_string += ", "
-
-        if hours > 0:
-            timedelta_string += str(hours) + " hours"
-
-            # Was this the last element to be printed? If not ...
-            if minutes + seconds > 0:
-                # Was this the second last element to be printed? If so ...
-                if seconds == 0:
-                    timedelta_string += " and "
-                else:
-                    timedelta_string += ", "
-
-        if minutes > 0:
-            timedelta_string += str(minutes) + " minutes"
-
-            # Was this the last element to be printed? If not ...
-            if days + hours + minutes + seconds > 0:
-                timedelta_string += " and "
-
-        if seconds > 0:
-            timedelta_string += str(seconds) + " seconds"
-
-        return timedelta_string
-
-    async def create_quote_embed(self, quoting_user, quote, alt=None):
+        years, days = divmod(timedelta.days, 365)
+        hours, seconds = divmod(timedelta.seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+
+        # Only mention units that aren't zero.
+        parts = [
+            "%d %s" % (amount, unit) for amount, unit in (
+                (years, "years"),
+                (days, "days"),
+                (hours, "hours"),
+                (minutes, "minutes"),
+                (seconds, "seconds")
+            ) if amount > 0
+        ]
+
+        if len(parts) < 2:
+            return "".join(parts)
+
+        return ", ".join(parts[:-1]) + " and " + parts[-1]
+
+    def create_quote_embed(self, quoting_user, quote, alt=None):
         """
         Create a discord.Embed object that can then be posted to a channel.
 
@@ -324,13 +694,15 @@ class ParrotBot(discord.Client):
             icon_url=quote.author.avatar_url
         )
 
-        footertext = "Quoted by %s." % (quoting_user.display_name)
-
         if quote.edited_timestamp: # Message was edited
-            post_edit_delta = quote.edited_timestamp - quote.timestamp
-            footertext += " Edited %s later." % (
-                await self.timedelta_timestamp_string(post_edit_delta)
+            footertext = "Quoted by %s. Edited %s later." % (
+                quoting_user.display_name,
+                self.timedelta_timestamp_string(
+                    quote.edited_timestamp - quote.timestamp
+                )
             )
+        else:
+            footertext = "Quoted by %s." % (quoting_user.display_name)
 
         quote_embed.set_footer(
             text=footertext,
@@ -341,101 +713,88 @@ class ParrotBot(discord.Client):
 
         return quote_embed
 
-    async def quote_message(self, quote, partial=False):
+    async def quote_message(
+        self,
+        quote,
+        quote_author,
+        quote_content,
+        permissions,
+        partial=False
+    ):
         """
         Try to find the quoted message and post an according embed message.
 
         Try to find the quoted message by passing quote to
-        self.search_message_by_quote(). If a fitting message was found and the
-        bot is allowed to send messages in the channel, construct an according
-        discord.Embed object and post it to the channel the quote originates
-        from, then delete the original quoting message if allowed. If no fitting
-        message was found, don't do anything.
+        self.search_message_by_quote(). If a fitting message was found,
+        construct an according discord.Embed object and post it to the channel
+        the quote originates from while deleting the original quoting message
+        if allowed. If no fitting message was found or the bot isn't allowed to
+        post embeds in the channel, don't do anything.
 
         Parameters
         ----------
         quote : discord.Message
             Message that could contain a quote from another message.
+        quote_author : str
+            Author part of the quote, empty if no author is given.
+        quote_content : str
+            Content part of the quote.
+        permissions : discord.Permissions
+            The bot's permissions in the quote's channel, which must include
+            sending messages.
         partial : boolean
             [Optional] Whether a partial quote is requested. In this case, only
             show the part given by the user in the embed box.
         """
-        quoted_message = await self.search_message_by_quote(quote, partial)
-
-        # Find own member object on the server.
-        bot_member = quote.server.get_member(self.user.id)
+        # Without the permission to post embeds, sending the quote would fail
+        # after the original message has already been deleted.
+        if not permissions.embed_links:
+            return
+
+        quoted_message, excerpt = await self.search_message_by_quote(
+            quote,
+            quote_author,
+            quote_content,
+            partial
+        )
 
-        # Check if the bot is allowed to send messages in that channel.
-        bot_may_send = quote.channel.permissions_for(bot_member).send_messages
+        if quoted_message:
+            quote_embed = self.create_quote_embed(
+                quote.author,
+                quoted_message,
+                excerpt
+            )
 
-        if quoted_message and bot_may_send:
-            if partial:
-                quote_request_match = self.re_partial_quote.fullmatch(
-                    quote.content
-                )
+            send_request = self.send_message(quote.channel, embed=quote_embed)
 
-                matched_quote = re.search(
-                    quote_request_match.group("content"),
-                    quoted_message.content,
-                    flags=re.IGNORECASE
-                )
+            # Don't even try deleting the quote without the permission to.
+            if not permissions.manage_messages:
+                await send_request
+                return
 
-                quote_embed = await self.create_quote_embed(
-                    quote.author,
-                    quoted_message,
-                    matched_quote.group(0)
-                )
-            else:
-                quote_embed = await self.create_quote_embed(
-                    quote.author,
-                    quoted_message
-                )
+            # Sending the embed and deleting the quote don't depend on each
+            # other, so do both at once.
+            send_result, delete_result = await asyncio.gather(
+                send_request,
+                self.delete_message(quote),
+                return_exceptions=True
+            )
 
-            await self.send_message(quote.channel, embed=quote_embed)
+            if isinstance(send_result, Exception):
+                raise send_result
 
-            try:
-                await self.delete_message(quote)
-            except discord.Forbidden:
-                pass
+            # Not being allowed to delete the quote is fine.
+            if isinstance(delete_result, Exception) \
+            and not isinstance(delete_result, discord.Forbidden):
+                raise delete_result
 
     async def send_help_message(self, channel):
         """Send the help message of the bot to the given channel."""
-        await self.send_message(
-            channel,
-            content="Quoting other users’ messages is easy. Just type a "
-            "greater-sign (>), followed by an excerpt from the message you "
-            "want to quote:\n```> sample message```\nI will attempt to "
-            "find the right message based on that excerpt and display it.\n"
-            "If I found the wrong message, consider increasing the length of "
-            "your excerpt. You can also preceed the greater-sign with a user’s "
-            "name to limit my search to messages from that user:\n"
-            "```sample_user > sample message```\nIf you want me to not display "
-            "the full message but only the part you gave me, type two "
-            "greater-signs instead of one:\n```>> sample```\nFor more "
-            "information on me, type “<@%s> info”. Also, if you still have "
-             "questions, feel free to join my support Discord: "
-             "https://discord.gg/rMXH2Rg" % (self.user.id)
-        )
+        await self.send_message(channel, content=self.help_message)
 
     async def send_info_message(self, channel):
         """Send information about the bot to the given channel."""
-        await self.send_message(
-            channel,
-            content="Hi, my name is ParrotBot and I’m here to assist you with "
-            "quoting other users’ messages – a functionality Discord still "
-            "lacks by default. If you’d like to know how to do that, just type "
-            "“<@%s> help”. Also, feel free to take a look at my source code on "
-            "https://github.com/mart-w/parrotbot/ if you’re interested in the "
-            "nitty gritty details.\n\nPlease note that I am free software: you "
-            "can redistribute my source code and/or modify it under the terms "
-            "of the GNU General Public License as published by the Free "
-            "Software Foundation, either version 3 of the License, or "
-            "(at your option) any later version.\n\nI am distributed in the "
-            "hope that I will be useful, but **without any warranty**; without "
-            "even the implied warranty of merchantability or fitness for a "
-            "particular purpose. See the GNU General Public License for more "
-            "details: http://www.gnu.org/licenses/" % (self.user.id)
-        )
+        await self.send_message(channel, content=self.info_message)
 
     async def handle_command(self, message):
         """
@@ -460,45 +819,64 @@ class ParrotBot(discord.Client):
         else:
             await self.send_info_message(message.channel)
 
+    async def close(self):
+        """Close the HTTP session for bot list sites and the Discord session."""
+        if self.server_count_post is not None:
+            self.server_count_post.cancel()
+            self.server_count_post = None
+
+        if self.bot_list_session is not None:
+            await self.bot_list_session.close()
+            self.bot_list_session = None
+
+        await super(ParrotBot, self).close()
+
     # Event listeners.
 
     async def on_ready(self):
         """
         Print ready message, post server count and set the bot's presence.
 
-        Compile the needed regular expresssion objects. Then
-        print a message saying that the server is ready and how many servers it
-        is connected to. If the according value in the config file is set to
-        True, also list all connected servers. Post the amount of connected
-        servers to bot list sites, if according tokens are fiven in the config
-        file. Finally set the bot's presence (game status) if one is specified
-        in the config file.
-        """
-        # Regular expression objects used to recognise quotes.
-        self.re_quote = re.compile(
-            r"\s*(?P<author>(?:<.*?>)|(?:.*?))\s*>\s*(?P<content>.+)"
-        )
-        self.re_partial_quote = re.compile(
-            r"\s*(?P<author>(?:<.*?>)|(?:.*?))\s*>>\s*(?P<content>.+)"
-        )
-
-        # Regular expression object for user mention strings.
-        self.re_user_mention = re.compile(r"<@!?(?P<ID>.*?)>")
-
+        Compile the regular expression object for commands and create the
+        bot's mention strings and help and info messages, unless that has
+        already been done on an earlier connection. Then print a message
+        saying that the server is ready and how many servers it is connected
+        to. If the according value in the config file is set to True, also
+        list all connected servers. Post the amount of connected servers to
+        bot list sites, if according tokens are fiven in the config file.
+        Finally set the bot's presence (game status) if one is specified in
+        the config file.
+        """
         # Must be initialised here because it depends on self.user.id.
-        self.re_command = re.compile(
-            r"\s*<@!?" + self.user.id + r">\s*(?P<command>.*?)\s*"
-        )
+        if self.re_command is None:
+            self.re_command = re.compile(
+                r"\s*<@!?" + self.user.id + r">\s*(?P<command>.*?)\s*"
+            )
+            self.mention_strings = (
+                "<@%s>" % (self.user.id),
+                "<@!%s>" % (self.user.id)
+            )
+            self.help_message = HELP_MESSAGE % (self.user.id)
+            self.info_message = INFO_MESSAGE % (self.user.id)
 
         print("ParrotBot is ready.")
         print("\nConnected Servers: %d" % (len(self.servers)))
 
         if self.config["server_list"]:
-            for server in self.servers:
-                print("%s - %s" % (server.id, server.name))
+            # Write the whole list at once instead of line by line.
+            sys.stdout.write("".join(
+                "%s - %s\n" % (server.id, server.name)
+                for server in self.servers
+            ))
 
         print()
 
+        # Keep connections to the bot list sites alive between posts.
+        if self.bot_list_session is None:
+            self.bot_list_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=60)
+            )
+
         await self.post_server_count()
 
         if "presence" in self.config:
@@ -510,15 +888,25 @@ class ParrotBot(discord.Client):
 
     async def on_server_join(self, server):
         """Print number of connected servers when connecting to a new server."""
-        print("Joined Server %s -- %s." % (server.id, server.name))
-        print("Connected Servers: %d\n" % (len(self.servers)))
-        await self.post_server_count()
+        sys.stdout.write(
+            "Joined Server %s -- %s.\nConnected Servers: %d\n\n" % (
+                server.id,
+                server.name,
+                len(self.servers)
+            )
+        )
+        self.schedule_server_count_post()
 
     async def on_server_remove(self, server):
         """Print number of connected servers when leaving a server."""
-        print("Left Server %s -- %s." % (server.id, server.name))
-        print("Connected Servers: %d\n" % (len(self.servers)))
-        await self.post_server_count()
+        sys.stdout.write(
+            "Left Server %s -- %s.\nConnected Servers: %d\n\n" % (
+                server.id,
+                server.name,
+                len(self.servers)
+            )
+        )
+        self.schedule_server_count_post()
 
     async def on_message(self, message):
         """
@@ -526,27 +914,110 @@ class ParrotBot(discord.Client):
 
         If the bot is initialised and the message matches the regular expression
         for commands, execute the command. If not, check whether the message
-        matches the regular expression for quotes or partial quote and quote the
-        message if that is the case. Messages from bots are ignored.
+        matches the regular expression for partial quotes or can be parsed as a
+        quote and quote the message if that is the case, limiting how many
+        quotes are handled at once and how long each may take. Messages from
+        bots are ignored, but like all messages they are added to the cached
+        logs of their channel.
 
         Parameters
         ----------
         message : discord.message
             The message the bot received.
         """
-        if self.initialised \
-        and not message.author.bot \
-        and message.channel.permissions_for(message.server.me).send_messages:
-            if self.re_command.fullmatch(message.content):
-                await self.handle_command(message)
-            elif self.re_partial_quote.fullmatch(message.content):
-                await self.quote_message(message, True)
-            elif self.re_quote.fullmatch(message.content):
-                await self.quote_message(message)
+        # Keep cached message logs of the channel up to date.
+        channel_logs = self.log_cache.get(message.channel.id)
+
+        if channel_logs:
+            if time.monotonic() - channel_logs.created < self.log_cache_ttl:
+                channel_logs.messages.insert(0, message)
 
+                # Fetched messages are appended to the end, which must not
+                # be cut off while a request is running.
+                if not channel_logs.fetch_lock.locked():
+                    del channel_logs.messages[self.log_fetch_limit + 1:]
+            else:
+                del self.log_cache[message.channel.id]
+
+        # Commands and quotes both contain a greater-sign, commands in the
+        # mention string. Check that first, as most messages are neither.
+        if not self.initialised \
+        or message.author.bot \
+        or ">" not in message.content:
+            return
+
+        permissions = message.channel.permissions_for(message.server.me)
+
+        if not permissions.send_messages:
+            return
+
+        # Only messages beginning with a mention of the bot can be commands.
+        if message.content.lstrip().startswith(self.mention_strings) \
+        and self.re_command.fullmatch(message.content):
+            await self.handle_command(message)
+            return
+
+        partial = True
+        quote_match = RE_PARTIAL_QUOTE.fullmatch(message.content)
 
-# Print GNU GPL notice
-print("""ParrotBot  Copyright (C) 2017  Martin W.
+        if quote_match:
+            quote_parts = quote_match.group("author", "content")
+        else:
+            partial = False
+            quote_parts = self.parse_quote(message.content)
+
+        if not quote_parts:
+            return
+
+        quote_author, quote_content = quote_parts
+
+        # Start caching the channel's logs before waiting for anything, so that
+        # messages posted in the meantime are not missed.
+        if message.channel.id not in self.log_cache:
+            channel_logs = ChannelLogs(message)
+            self.log_cache[message.channel.id] = channel_logs
+
+            # Channels may go quiet, so don't wait for another message to
+            # remove the logs.
+            self.loop.call_later(
+                self.log_cache_ttl,
+                self.expire_channel_logs,
+                message.channel.id,
+                channel_logs
+            )
+
+        async with self.quote_semaphore:
+            try:
+                await asyncio.wait_for(
+                    self.quote_message(
+                        message,
+                        quote_author,
+                        quote_content,
+                        permissions,
+                        partial
+                    ),
+                    self.quote_timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def on_message_delete(self, message):
+        """Remove a deleted message from the cached logs of its channel."""
+        channel_logs = self.log_cache.get(message.channel.id)
+
+        if channel_logs:
+            channel_logs.messages[:] = [
+                cached_message for cached_message in channel_logs.messages
+                if cached_message.id != message.id
+            ]
+
+            # Without any messages left, there is nothing to continue from.
+            if not channel_logs.messages:
+                del self.log_cache[message.channel.id]
+
+
+# GNU GPL notice printed on startup.
+GPL_NOTICE = """ParrotBot  Copyright (C) 2017  Martin W.
 
 This program is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
@@ -559,28 +1030,77 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 GNU General Public License for more details.
 
 You should have received a copy of the GNU General Public License
-along with this program.  If not, see <http://www.gnu.org/licenses/>.\n""")
-
-# Configuration object.
-config = {}
-
-# Will be set to True if config.json misses keys or does not exist yet.
-configfile_needs_update = False
-
-# Try to read configuration file.
-try:
-    with open("config.json", "r") as configfile:
-        config = json.load(configfile)
-except FileNotFoundError:
-    print("Configuration file not found!")
-    configfile_needs_update = True
-
-# Check for token.txt for backwards compatibility. If found, get the token file
-# from it and use it for the new configuration, if that does not contain a token
-# yet.
-try:
-    with open("token.txt", "r") as tokenfile:
-        token_from_txt = tokenfile.readline().rstrip()
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# ParrotBot object of the current session, set by run_bot().
+client = None
+
+async def run_bot(config):
+    """
+    Run bot sessions on the current event loop until the program is stopped.
+
+    Start a session with a new ParrotBot object and store it in client. If it
+    fails, print the error, wait five seconds without blocking the event loop
+    and start over. All sessions share the event loop, so restarting doesn't
+    require setting up a new one.
+
+    Parameters
+    ----------
+    config : dict
+        Configuration object for the bot, created from the configuration file.
+    """
+    global client
+
+    while True:
+        # Initialise client object with the loaded configuration.
+        client = ParrotBot(config)
+
+        try:
+            # Start bot session.
+            print("Start bot session with token %s" % (config["discord-token"]))
+            await client.start(config["discord-token"])
+        except asyncio.CancelledError:
+            # The program is being stopped, so don't start over.
+            raise
+        except Exception as exception:
+            # Release the connections of the failed session.
+            await client.close()
+
+            print(type(exception))
+            print(exception)
+            print("\n--------------------------------------------")
+            print("An error occured. Retrying in 5 seconds ...")
+            print("--------------------------------------------\n")
+
+            await asyncio.sleep(5)
+
+
+if __name__ == "__main__":
+    # Print GNU GPL notice
+    sys.stdout.write(GPL_NOTICE)
+
+    # Configuration object.
+    config = {}
+
+    # Will be set to True if config.json misses keys or does not exist yet.
+    configfile_needs_update = False
+
+    # Try to read configuration file.
+    try:
+        with open("config.json", "r") as configfile:
+            config = json.load(configfile)
+    except FileNotFoundError:
+        print("Configuration file not found!")
+        configfile_needs_update = True
+
+    # Check for token.txt for backwards compatibility. If found, get the token
+    # file from it and use it for the new configuration, if that does not
+    # contain a token yet.
+    try:
+        token_from_txt = pathlib.Path("token.txt").read_text().split("\n", 1)[0]
+        token_from_txt = token_from_txt.rstrip()
         print(
             "token.txt found. Usage of this file is deprecated; the token will "
             "be written to the new config.json file."
@@ -588,81 +1108,97 @@ try:
         if "discord-token" not in config:
             config["discord-token"] = token_from_txt
             configfile_needs_update = True
-except FileNotFoundError:
-    pass
-
-# Check if the loaded configuration misses keys. If so, ask for user input or
-# assume a default value.
-
-# Discord API token.
-if "discord-token" not in config:
-    configfile_needs_update = True
-    config["discord-token"] = input(
-        "Discord API token not found. Please enter your API token: "
-    )
-
-# discordbots.org API token
-if "discordbots_org_token" not in config:
-    configfile_needs_update = True
-    config["discordbots_org_token"] = input(
-        "discordbots.org API token not found. Please enter your API token "
-        "(leave empty to ignore discordbots.org): "
-    )
-
-# bots.discord.pw API token
-if "bots_discord_pw_token" not in config:
-    configfile_needs_update = True
-    config["bots_discord_pw_token"] = input(
-        "bots.discord.pw API token not found. Please enter your API token "
-        "(leave empty to ignore bots.discord.pw): "
-    )
-
-# presence (game status)
-if "presence" not in config:
-    configfile_needs_update = True
-    config["presence"] = input(
-        "Please specify a presence or game status. This will be shown in the "
-        "bot's user profile (leave empty to disable this feature): "
-    )
-
-# whether the server list should be displayed on startup
-if "server_list" not in config:
-    configfile_needs_update = True
-
-    answer = None
-
-    while answer == None or answer.lower() not in ("y", "yes", "n", "no", ""):
-        answer = input(
-            "Should the bot list all connected servers on startup? [Y/n]: "
+    except FileNotFoundError:
+        pass
+
+    # Check if the loaded configuration misses keys. If so, ask for user input
+    # or assume a default value.
+
+    # Discord API token.
+    if "discord-token" not in config:
+        configfile_needs_update = True
+        config["discord-token"] = input(
+            "Discord API token not found. Please enter your API token: "
         )
 
-        if answer.lower() not in ("y", "yes", "n", "no", ""):
-            print("\nPlease answer with either yes or no.\n")
+    # discordbots.org API token
+    if "discordbots_org_token" not in config:
+        configfile_needs_update = True
+        config["discordbots_org_token"] = input(
+            "discordbots.org API token not found. Please enter your API token "
+            "(leave empty to ignore discordbots.org): "
+        )
 
-    if answer.lower() in ("y", "yes", ""):
-        config["server_list"] = True
-    else:
-        config["server_list"] = False
+    # bots.discord.pw API token
+    if "bots_discord_pw_token" not in config:
+        configfile_needs_update = True
+        config["bots_discord_pw_token"] = input(
+            "bots.discord.pw API token not found. Please enter your API token "
+            "(leave empty to ignore bots.discord.pw): "
+        )
+
+    # presence (game status)
+    if "presence" not in config:
+        configfile_needs_update = True
+        config["presence"] = input(
+            "Please specify a presence or game status. This will be shown in "
+            "the bot's user profile (leave empty to disable this feature): "
+        )
 
-# (Re)write configuration file if it didn't exist or missed keys.
-if configfile_needs_update:
-    with open("config.json", "w") as configfile:
-        json.dump(config, configfile, indent=2)
-        print("Configuration file updated.")
+    # whether the server list should be displayed on startup
+    if "server_list" not in config:
+        configfile_needs_update = True
+
+        answer = None
+
+        while answer == None \
+        or answer.lower() not in ("y", "yes", "n", "no", ""):
+            answer = input(
+                "Should the bot list all connected servers on startup? [Y/n]: "
+            )
+
+            if answer.lower() not in ("y", "yes", "n", "no", ""):
+                print("\nPlease answer with either yes or no.\n")
+
+        if answer.lower() in ("y", "yes", ""):
+            config["server_list"] = True
+        else:
+            config["server_list"] = False
 
+    # (Re)write configuration file if it didn't exist or missed keys.
+    if configfile_needs_update:
+        with open("config.json", "w") as configfile:
+            json.dump(config, configfile, indent=2)
+            print("Configuration file updated.")
 
-while True:
+    # Use uvloop's faster event loop if it is installed.
     try:
-        # Initialise client object with the loaded configuration.
-        client = ParrotBot(config)
-        # Start bot session.
-        print("Start bot session with token %s" % (config["discord-token"]))
-        client.run(config["discord-token"])
-    except Exception as exception:
-        print(type(exception))
-        print(exception)
-        print("\n--------------------------------------------")
-        print("An error occured. Retrying in 5 seconds ...")
-        print("--------------------------------------------\n")
-
-        time.sleep(5)
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    loop = asyncio.get_event_loop()
+    bot_task = loop.create_task(run_bot(config))
+
+    try:
+        loop.run_until_complete(bot_task)
+    except KeyboardInterrupt:
+        # Log out and cancel all remaining tasks like discord.Client.run()
+        # does, but keep run_bot() from starting a new session first.
+        bot_task.cancel()
+
+        if client is not None:
+            loop.run_until_complete(client.close())
+
+        pending = asyncio.Task.all_tasks(loop=loop)
+
+        for task in pending:
+            task.cancel()
+
+        loop.run_until_complete(
+            asyncio.gather(*pending, return_exceptions=True)
+        )
+    finally:
+        loop.close()